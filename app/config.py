@@ -1,50 +1,75 @@
 import asyncio
+import atexit
+import json
+import logging
+import os
 import tomllib
+from collections import defaultdict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from types import MappingProxyType
+from typing import Final
 
 import discord
 import yt_dlp
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field, field_serializer, field_validator
 from yt_dlp import YoutubeDL
 
-default_ffmpeg_options = {
-    "before_options": (
-        "-reconnect 1 "
-        "-reconnect_streamed 1 "
-        "-reconnect_delay_max 5 "
-        "-reconnect_on_network_error 1 "
-        "-reconnect_on_http_error 4xx,5xx "
-        "-rw_timeout 5000000 "
-        "-nostdin "
-        "-hide_banner "
-        "-user_agent 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-        "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36' "
-        "-analyzeduration 10M "
-        "-probesize 10M "
-        "-thread_queue_size 4096 "
-        "-loglevel warning "
-        "-err_detect ignore_err "
-        "-fflags +discardcorrupt "
-    ),
-    "options": (
-        "-vn "
-        "-acodec libopus "
-        "-ar 48000 "
-        "-ac 2 "
-        "-b:a 96k "
-        "-application audio "
-        "-packet_loss 15 "
-        "-fec 1 "
-        "-vbr on "
-        "-compression_level 0 "
-        "-frame_duration 20 "
-        "-bufsize 8M "
-        "-avoid_negative_ts make_zero "
-        "-fflags +genpts+igndts "
-        "-max_muxing_queue_size 9999 "
-        "-af asetpts=PTS-STARTPTS,volume=1.0 "
-    ),
-}
+logger = logging.getLogger(__name__)
+
+# Read-only so every RadioConfig can share it without risk of one station mutating another
+default_ffmpeg_options: Final[Mapping[str, str]] = MappingProxyType(
+    {
+        "before_options": (
+            "-reconnect 1 "
+            "-reconnect_streamed 1 "
+            "-reconnect_delay_max 5 "
+            "-reconnect_on_network_error 1 "
+            "-reconnect_on_http_error 4xx,5xx "
+            "-rw_timeout 5000000 "
+            "-nostdin "
+            "-hide_banner "
+            "-user_agent 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+            "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36' "
+            "-analyzeduration 10M "
+            "-probesize 10M "
+            "-thread_queue_size 4096 "
+            "-loglevel warning "
+            "-err_detect ignore_err "
+            "-fflags +discardcorrupt "
+        ),
+        "options": (
+            "-vn "
+            "-acodec libopus "
+            "-ar 48000 "
+            "-ac 2 "
+            "-b:a 96k "
+            "-application audio "
+            "-packet_loss 15 "
+            "-fec 1 "
+            "-vbr on "
+            "-compression_level 0 "
+            "-frame_duration 20 "
+            "-bufsize 8M "
+            "-avoid_negative_ts make_zero "
+            "-fflags +genpts+igndts "
+            "-max_muxing_queue_size 9999 "
+            "-af asetpts=PTS-STARTPTS,volume=1.0 "
+        ),
+    }
+)
+
+YTDL_FFMPEG_BEFORE_OPTIONS: Final[str] = (
+    "-reconnect 1 "
+    "-reconnect_streamed 1 "
+    "-reconnect_delay_max 5 "
+    "-nostdin "
+    "-probesize 10M "
+    "-analyzeduration 10M"
+)
+# Bitrate and Opus codec flags are added by FFmpegOpusAudio itself
+YTDL_FFMPEG_OPTIONS: Final[str] = "-vn -bufsize 512k -async 1"
 
 yt_dlp_format_options: dict = {
     "format": "bestaudio[abr>=128]/bestaudio/best",  # Prefer higher bitrate audio
@@ -62,10 +87,22 @@ yt_dlp_format_options: dict = {
 
 ytdl = yt_dlp.YoutubeDL(yt_dlp_format_options)
 
+# Dedicated pool so slow yt-dlp extractions don't starve the loop's default executor
+YTDL_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ytdl")
+atexit.register(YTDL_EXECUTOR.shutdown, wait=False, cancel_futures=True)
+
+
+class YTDLSource(discord.FFmpegOpusAudio):
+    """yt-dlp track encoded to Opus by ffmpeg, so discord.py sends frames without re-encoding."""
 
-class YTDLSource(discord.PCMVolumeTransformer):
     def __init__(self, source, *, data, volume=0.5):
-        super().__init__(source, volume)
+        # Volume is applied by ffmpeg before encoding instead of per frame in Python
+        super().__init__(
+            source,
+            bitrate=128,
+            before_options=YTDL_FFMPEG_BEFORE_OPTIONS,
+            options=f"{YTDL_FFMPEG_OPTIONS} -af volume={volume}",
+        )
 
         self.data = data
 
@@ -74,11 +111,12 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.duration = data.get("duration")
 
     @classmethod
-    async def from_url(cls, url, *, loop=None, stream=False, ytdl_client: YoutubeDL = ytdl):
+    async def extract_info(
+        cls, url, *, loop=None, stream=False, ytdl_client: YoutubeDL = ytdl
+    ) -> dict:
+        """Resolve a URL or search query to yt-dlp info for a single entry."""
         loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(
-            None, lambda: ytdl_client.extract_info(url, download=not stream)
-        )
+        data = await loop.run_in_executor(YTDL_EXECUTOR, ytdl_client.extract_info, url, not stream)
 
         if "entries" in data:
             # Handle playlists and search results - take first item
@@ -86,34 +124,74 @@ class YTDLSource(discord.PCMVolumeTransformer):
                 raise ValueError("No results found")
             data = data["entries"][0]
 
+        return data
+
+    @classmethod
+    def from_data(cls, data: dict, *, stream=False, ytdl_client: YoutubeDL = ytdl):
+        """Build a playable source from info returned by extract_info."""
         filename = data.get("url") if stream else ytdl_client.prepare_filename(data)
 
         if not filename:
             raise ValueError("Could not retrieve filename or URL")
 
-        # Use FFmpegPCMAudio with enhanced options for better audio quality
-        # PCMVolumeTransformer requires non-Opus encoded audio
-        return cls(
-            discord.FFmpegPCMAudio(
-                filename,
-                before_options=(
-                    "-reconnect 1 "
-                    "-reconnect_streamed 1 "
-                    "-reconnect_delay_max 5 "
-                    "-nostdin "
-                    "-probesize 10M "
-                    "-analyzeduration 10M"
-                ),
-                options=("-vn -b:a 128k -ar 48000 -ac 2 -bufsize 512k -async 1"),
-            ),
-            data=data,
-        )
+        return cls(filename, data=data)
+
+    @classmethod
+    async def from_url(cls, url, *, loop=None, stream=False, ytdl_client: YoutubeDL = ytdl):
+        data = await cls.extract_info(url, loop=loop, stream=stream, ytdl_client=ytdl_client)
+        return cls.from_data(data, stream=stream, ytdl_client=ytdl_client)
 
 
 class RadioConfig(BaseModel):
+    # Stations are shared across lookup tables, so they must not change after loading
+    model_config = ConfigDict(frozen=True)
+
     name: str
     stream_url: str
-    ffmpeg_options: dict[str, str] = Field(default_factory=lambda: default_ffmpeg_options)
+    tags: tuple[str, ...] = ()
+    ffmpeg_options: Mapping[str, str] = Field(default_factory=lambda: default_ffmpeg_options)
+
+    @field_validator("ffmpeg_options", mode="after")
+    @classmethod
+    def freeze_ffmpeg_options(cls, value: Mapping[str, str]) -> Mapping[str, str]:
+        # Pydantic turns explicit values into a plain dict; keep them read-only like the default
+        return MappingProxyType(dict(value))
+
+    @field_serializer("ffmpeg_options")
+    def serialize_ffmpeg_options(self, value: Mapping[str, str]) -> dict[str, str]:
+        return dict(value)
+
+    def __hash__(self):
+        # ffmpeg_options is a mappingproxy and cannot be hashed; equal stations still hash equal
+        return hash((self.name, self.stream_url, self.tags))
+
+
+def read_station_config(config_file: Path) -> dict:
+    """Parse the station TOML, reusing a JSON cache written for the same file version."""
+    cache_file = config_file.with_name(f"{config_file.name}.cache.json")
+    stat = config_file.stat()
+    version = [stat.st_mtime_ns, stat.st_size]
+
+    try:
+        cached = json.loads(cache_file.read_bytes())
+        if cached.get("version") == version:
+            return cached["data"]
+    except (OSError, ValueError, AttributeError, KeyError):
+        pass
+
+    # Read the whole file in one call and parse from memory rather than a buffered handle
+    data = tomllib.loads(config_file.read_bytes().decode("utf-8"))
+
+    # Write to a temporary file and rename so readers never see a partial cache
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        tmp_file.write_text(json.dumps({"version": version, "data": data}), encoding="utf-8")
+        os.replace(tmp_file, cache_file)
+    except (OSError, TypeError, ValueError) as e:
+        logger.warning("Could not write station config cache %s: %s", cache_file, e)
+        tmp_file.unlink(missing_ok=True)
+
+    return data
 
 
 def load_radio_stations(config_path: str = "radio_stations.toml") -> list[RadioConfig]:
@@ -135,8 +213,7 @@ def load_radio_stations(config_path: str = "radio_stations.toml") -> list[RadioC
             f"Could not find {config_path}. Searched in: {[str(p) for p in possible_paths]}"
         )
 
-    with open(config_file, "rb") as f:
-        data = tomllib.load(f)
+    data = read_station_config(config_file)
 
     stations = []
     for station_data in data.get("stations", []):
@@ -144,6 +221,7 @@ def load_radio_stations(config_path: str = "radio_stations.toml") -> list[RadioC
             RadioConfig(
                 name=station_data["name"],
                 stream_url=station_data["stream_url"],
+                tags=tuple(station_data.get("tags", ())),
             )
         )
 
@@ -151,3 +229,82 @@ def load_radio_stations(config_path: str = "radio_stations.toml") -> list[RadioC
 
 
 known_radio_streams: list[RadioConfig] = load_radio_stations()
+
+# Lookup tables for station resolution; known_radio_streams is not mutated at runtime
+radio_by_name: dict[str, RadioConfig] = {radio.name: radio for radio in known_radio_streams}
+radio_by_lowername: dict[str, RadioConfig] = {
+    radio.name.lower(): radio for radio in known_radio_streams
+}
+
+
+def build_tag_index(stations: list[RadioConfig]) -> dict[str, set[str]]:
+    """Map each lowercased tag to the names of the stations carrying it."""
+    index: defaultdict[str, set[str]] = defaultdict(set)
+    for station in stations:
+        for tag in station.tags:
+            index[tag.strip().lower()].add(station.name)
+    return dict(index)
+
+
+# Inverted index used to answer tag searches from configured stations first
+station_names_by_tag: dict[str, set[str]] = build_tag_index(known_radio_streams)
+
+
+class StationTrie:
+    """Prefix tree over lowercased station names, used for autocomplete."""
+
+    __slots__ = ("children", "stations")
+
+    def __init__(self):
+        self.children: dict[str, StationTrie] = {}
+        # Every station whose name passes through this node, in insertion order
+        self.stations: list[RadioConfig] = []
+
+    def insert(self, station: RadioConfig):
+        node = self
+        node.stations.append(station)
+        for char in station.name.lower():
+            node = node.children.setdefault(char, StationTrie())
+            node.stations.append(station)
+
+    def search_prefix(self, prefix: str, limit: int) -> list[RadioConfig]:
+        """Return up to limit stations whose lowercased name starts with prefix."""
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        return node.stations[:limit]
+
+
+def build_station_trie(stations: list[RadioConfig]) -> StationTrie:
+    trie = StationTrie()
+    for station in stations:
+        trie.insert(station)
+    return trie
+
+
+# Prefix index answering /play autocomplete without scanning every station
+station_trie: StationTrie = build_station_trie(known_radio_streams)
+
+# Discord rejects messages longer than this many characters
+DISCORD_MESSAGE_LIMIT = 2000
+
+
+def render_station_list(stations: list[RadioConfig]) -> list[str]:
+    """Render the station listing, split into chunks that fit in a Discord message."""
+    chunks = []
+    current = "Available stations:"
+    for station in stations:
+        line = f"{station.name}: {station.stream_url}"
+        if len(current) + 1 + len(line) > DISCORD_MESSAGE_LIMIT:
+            chunks.append(current)
+            current = line[:DISCORD_MESSAGE_LIMIT]
+        else:
+            current = f"{current}\n{line}"
+    chunks.append(current)
+    return chunks
+
+
+# Pre-rendered /list output; stations are fixed for the lifetime of the process
+station_list_messages: list[str] = render_station_list(known_radio_streams)
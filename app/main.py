@@ -3,13 +3,27 @@ import logging
 import os
 import re
 import time
+from collections import deque
+from dataclasses import dataclass
 
 import discord
-from config import RadioConfig, YTDLSource, known_radio_streams
+from config import (
+    RadioConfig,
+    YTDLSource,
+    known_radio_streams,
+    radio_by_lowername,
+    radio_by_name,
+    station_list_messages,
+    station_trie,
+)
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
-from utils import search_radio_station_by_tags
+from utils import (
+    RADIO_SEARCH_EXECUTOR,
+    search_known_station_by_tags,
+    search_radio_station_by_tags,
+)
 
 # Configure logging
 logging.basicConfig(
@@ -29,45 +43,94 @@ intents = discord.Intents.default()
 intents.message_content = True
 
 
+# Quiet period before a presence update is sent, so bursts collapse into one call
+PRESENCE_DEBOUNCE_SECONDS = 0.2
+
+
 class RadioBot(commands.Bot):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._latest_activity: discord.BaseActivity | None = None
+        self._presence_pending = asyncio.Event()
+        self._presence_task: asyncio.Task | None = None
+
     async def setup_hook(self):
+        self._presence_task = self.loop.create_task(self._flush_presence())
         logger.info("Syncing command tree...")
         await self.tree.sync()
         logger.info("Command tree synced.")
 
+    async def close(self):
+        if self._presence_task:
+            self._presence_task.cancel()
+        await super().close()
+
+    def schedule_presence(self, activity: discord.BaseActivity | None):
+        """Record the latest activity; it is sent once updates have been quiet for a moment."""
+        self._latest_activity = activity
+        self._presence_pending.set()
+
+    async def _flush_presence(self):
+        while True:
+            await self._presence_pending.wait()
+            await asyncio.sleep(PRESENCE_DEBOUNCE_SECONDS)
+            self._presence_pending.clear()
+            try:
+                await self.change_presence(activity=self._latest_activity)
+            except Exception as e:
+                logger.error("Failed to update presence: %s", e)
+
 
 bot = RadioBot(command_prefix="!", intents=intents)
 
+
+@dataclass(slots=True)
+class QueueItem:
+    """A queued YouTube request"""
+
+    url: str
+    requester: discord.Member
+    display: str
+    prefetch: asyncio.Task | None = None
+
+
 # Dictionary to store queues per guild
-guild_queues: dict[int, list[dict]] = {}
+guild_queues: dict[int, deque[QueueItem]] = {}
 
 # Dictionary to store currently playing track info per guild for retry logic
 guild_current_track: dict[int, dict] = {}
 
+# Limits how many upcoming tracks are resolved with yt-dlp in the background at once
+prefetch_semaphore = asyncio.Semaphore(2)
+
+# Compiled once at import; matched against every query and queue entry
+URL_PATTERN = re.compile(
+    r"^(https?://)?(www\.)?(youtube\.com|youtu\.be|m\.youtube\.com)/.+$", re.IGNORECASE
+)
+
 try:
     DISCORD_TOKEN = os.environ["DISCORD_TOKEN"]
 except KeyError as e:
     raise OSError(f"Required environment variable {e} is not set") from e
 
 
+# Select options are built once; each RadioSelect gets a shallow copy of the list
+RADIO_OPTIONS = [
+    discord.SelectOption(label=radio.name, value=radio.name, description=radio.stream_url[:100])
+    for radio in known_radio_streams
+]
+
+
 class RadioSelect(discord.ui.Select):
     def __init__(self):
-        options = [
-            discord.SelectOption(
-                label=radio.name, value=radio.name, description=radio.stream_url[:100]
-            )
-            for radio in known_radio_streams
-        ]
-        super().__init__(placeholder="Select a radio station...", options=options)
+        super().__init__(placeholder="Select a radio station...", options=list(RADIO_OPTIONS))
 
     async def callback(self, interaction: discord.Interaction):
         # Defer immediately to prevent timeout
         await interaction.response.defer()
 
         station_name = self.values[0]
-        radio_station = next(
-            (radio for radio in known_radio_streams if radio.name == station_name), None
-        )
+        radio_station = radio_by_name.get(station_name)
 
         if not radio_station:
             return await interaction.followup.send("Station not found!", ephemeral=True)
@@ -88,7 +151,7 @@ async def get_voice_client(user: discord.Member, guild: discord.Guild) -> discor
     if guild.voice_client:
         return guild.voice_client  # type: ignore
 
-    logger.info(f"Connecting to voice channel: {user.voice.channel.name}")
+    logger.info("Connecting to voice channel: %s", user.voice.channel.name)
     return await user.voice.channel.connect()
 
 
@@ -97,10 +160,10 @@ async def play_stream(voice_client: discord.VoiceClient, station: RadioConfig):
         voice_client.stop()
 
     if not station.stream_url:
-        logger.error(f"Station {station.name} has no stream URL")
+        logger.error("Station %s has no stream URL", station.name)
         return
 
-    logger.info(f"Starting stream: {station.name} ({station.stream_url})")
+    logger.info("Starting stream: %s (%s)", station.name, station.stream_url)
     try:
         source = await discord.FFmpegOpusAudio.from_probe(
             station.stream_url,
@@ -108,24 +171,72 @@ async def play_stream(voice_client: discord.VoiceClient, station: RadioConfig):
             options=station.ffmpeg_options["options"],
         )
     except Exception as e:
-        logger.error(f"Failed to create audio source: {e}")
+        logger.error("Failed to create audio source: %s", e)
         return
 
     def after_playing(error):
         if error:
-            logger.error(f"Player error: {error}")
+            logger.error("Player error: %s", error)
         else:
             logger.info("Stream finished or stopped.")
 
     voice_client.play(source, after=after_playing)
 
 
-async def change_status(bot, radio_station: RadioConfig):
-    await bot.change_presence(
-        activity=discord.Activity(type=discord.ActivityType.listening, name=radio_station.name)
+def change_status(bot, radio_station: RadioConfig):
+    bot.schedule_presence(
+        discord.Activity(type=discord.ActivityType.listening, name=radio_station.name)
     )
 
 
+class InteractionAdapter:
+    """Uniform user/guild/send access for a component interaction"""
+
+    __slots__ = ("user", "guild", "_send")
+
+    def __init__(self, interaction: discord.Interaction):
+        self.user = interaction.user
+        self.guild = interaction.guild
+        # Assumes interaction is already deferred if it takes time,
+        # or we use followup.
+        self._send = interaction.followup.send
+
+    async def send(self, msg: str, *, ephemeral: bool = False):
+        await self._send(msg, ephemeral=ephemeral)
+
+
+class ContextAdapter:
+    """Uniform user/guild/send access for a command context"""
+
+    __slots__ = ("user", "guild", "_send")
+
+    def __init__(self, ctx: commands.Context):
+        self.user = ctx.author
+        self.guild = ctx.guild
+        self._send = ctx.send
+
+    async def send(self, msg: str, *, ephemeral: bool = False):
+        await self._send(msg)
+
+
+SOURCE_ADAPTERS: dict[type, type[InteractionAdapter | ContextAdapter]] = {
+    discord.Interaction: InteractionAdapter,
+    commands.Context: ContextAdapter,
+}
+
+
+def adapt_source(
+    source: discord.Interaction | commands.Context,
+) -> InteractionAdapter | ContextAdapter:
+    adapter_cls = SOURCE_ADAPTERS.get(type(source))
+    if adapter_cls is None:
+        # Subclasses (e.g. custom contexts) miss the exact-type lookup
+        adapter_cls = (
+            InteractionAdapter if isinstance(source, discord.Interaction) else ContextAdapter
+        )
+    return adapter_cls(source)
+
+
 async def play_and_notify(source: discord.Interaction | commands.Context, station: RadioConfig):
     """
     Helper to handle common playback logic:
@@ -135,41 +246,24 @@ async def play_and_notify(source: discord.Interaction | commands.Context, statio
     4. Update status
     5. Notify user
     """
-    # Determine user, guild, and send method
-    if isinstance(source, discord.Interaction):
-        user = source.user
-        guild = source.guild
-        # Assumes interaction is already deferred if it takes time,
-        # or we use followup.
-        send_func = source.followup.send
-    else:
-        user = source.author
-        guild = source.guild
-        send_func = source.send
+    adapter = adapt_source(source)
+    user = adapter.user
+    guild = adapter.guild
 
     if not isinstance(user, discord.Member) or not guild:
-        msg = "You must be in a guild to use this."
-        if isinstance(source, discord.Interaction):
-            await send_func(msg, ephemeral=True)
-        else:
-            await send_func(msg)
-        return
+        return await adapter.send("You must be in a guild to use this.", ephemeral=True)
 
     try:
         voice_client = await get_voice_client(user, guild)
         await play_stream(voice_client, station)
-        await change_status(bot, station)
+        change_status(bot, station)
 
-        logger.info(f"Playing {station.name} requested by {user} in {guild}")
-        await send_func(f"Now playing: **{station.name}**\n{station.stream_url}")
+        logger.info("Playing %s requested by %s in %s", station.name, user, guild)
+        await adapter.send(f"Now playing: **{station.name}**\n{station.stream_url}")
 
     except Exception as e:
-        logger.error(f"Failed to play {station.name}: {e}", exc_info=True)
-        msg = f"Error: {e}"
-        if isinstance(source, discord.Interaction):
-            await send_func(msg, ephemeral=True)
-        else:
-            await send_func(msg)
+        logger.error("Failed to play %s: %s", station.name, e, exc_info=True)
+        await adapter.send(f"Error: {e}", ephemeral=True)
 
 
 @bot.hybrid_command(name="ping", description="Check if the bot is alive")
@@ -179,10 +273,8 @@ async def ping(ctx):
 
 @bot.hybrid_command(name="list", description="List all available radio stations")
 async def list_radio_stations(ctx):
-    stations = "\n".join(
-        [f"{station.name}: {station.stream_url}" for station in known_radio_streams]
-    )
-    await ctx.send(f"Available stations:\n{stations}")
+    for message in station_list_messages:
+        await ctx.send(message)
 
 
 @bot.hybrid_command(name="join", description="Join the voice channel you are in")
@@ -208,11 +300,16 @@ async def play_random_by_tags(ctx, *, tags: str | None = None):
     # Split by comma if present, otherwise by space
     tag_list = tags.split(",") if "," in tags else tags.split()
 
-    try:
-        radio_station = await asyncio.to_thread(lambda: search_radio_station_by_tags(tag_list))
-    except Exception as e:
-        logger.error(f"Error searching for radio station: {e}")
-        return await ctx.send(f"Error searching for stations: {e}")
+    # Prefer configured stations; only query RadioBrowser when none match
+    radio_station = search_known_station_by_tags(tag_list)
+    if not radio_station:
+        try:
+            radio_station = await bot.loop.run_in_executor(
+                RADIO_SEARCH_EXECUTOR, search_radio_station_by_tags, tag_list
+            )
+        except Exception as e:
+            logger.error("Error searching for radio station: %s", e)
+            return await ctx.send(f"Error searching for stations: {e}")
 
     if not radio_station:
         return await ctx.send(f"No stations found for tags: {tags}")
@@ -230,9 +327,7 @@ async def play_radio(ctx, station: str | None = None):
     if station is None:
         return await ctx.send("Select a radio station:", view=RadioView())
 
-    radio_station = next(
-        (radio for radio in known_radio_streams if radio.name.lower() == station.lower()), None
-    )
+    radio_station = radio_by_lowername.get(station.lower())
 
     if not radio_station:
         available = ", ".join(r.name for r in known_radio_streams)
@@ -241,6 +336,17 @@ async def play_radio(ctx, station: str | None = None):
     await play_and_notify(ctx, radio_station)
 
 
+@play_radio.autocomplete("station")
+async def station_autocomplete(
+    interaction: discord.Interaction, current: str
+) -> list[app_commands.Choice[str]]:
+    # Discord shows at most 25 choices and rejects names or values over 100 characters
+    return [
+        app_commands.Choice(name=radio.name[:100], value=radio.name[:100])
+        for radio in station_trie.search_prefix(current.lower(), limit=25)
+    ]
+
+
 @bot.hybrid_command(name="stop", description="Stop playing and disconnect")
 async def stop(ctx):
     if not ctx.guild:
@@ -249,12 +355,11 @@ async def stop(ctx):
     if ctx.guild.voice_client:
         # Clear queue and current track info
         guild_id = ctx.guild.id
-        if guild_id in guild_queues:
-            guild_queues[guild_id].clear()
+        clear_guild_queue(guild_id)
         if guild_id in guild_current_track:
             del guild_current_track[guild_id]
 
-        await bot.change_presence(activity=None)
+        bot.schedule_presence(None)
         await ctx.guild.voice_client.disconnect()
         await ctx.send("Disconnected from voice channel.")
     else:
@@ -271,7 +376,7 @@ async def skip(ctx):
         return await ctx.send("Nothing is playing right now.")
 
     guild_id = ctx.guild.id
-    queue_length = len(guild_queues.get(guild_id, []))
+    queue_length = len(guild_queues.get(guild_id, ()))
 
     if queue_length > 0:
         await ctx.send(f"Skipping to next song... ({queue_length} songs left in queue)")
@@ -283,42 +388,95 @@ async def skip(ctx):
     voice_client.stop()
 
 
+def clear_guild_queue(guild_id: int):
+    """Empty a guild's queue, cancelling any prefetches still in flight"""
+    queue = guild_queues.get(guild_id)
+    if not queue:
+        return
+
+    for item in queue:
+        if item.prefetch:
+            item.prefetch.cancel()
+    queue.clear()
+
+
+async def prefetch_track_info(url: str) -> dict:
+    async with prefetch_semaphore:
+        return await YTDLSource.extract_info(url, loop=bot.loop, stream=True)
+
+
+def mark_prefetch_retrieved(task: asyncio.Task):
+    # Failed prefetches may be dropped with the queue before anyone awaits them;
+    # reading the exception stops asyncio logging "Task exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+
+
+def schedule_prefetch(guild_id: int):
+    """Start resolving the next queued track so it can play without an extraction delay"""
+    queue = guild_queues.get(guild_id)
+    if queue and queue[0].prefetch is None:
+        queue[0].prefetch = bot.loop.create_task(prefetch_track_info(queue[0].url))
+        queue[0].prefetch.add_done_callback(mark_prefetch_retrieved)
+
+
 async def play_next_in_queue(guild: discord.Guild, voice_client: discord.VoiceClient):
-    """Check queue and play next item if available"""
+    """Play the next playable item in the queue, skipping items that fail to load"""
     guild_id = guild.id
+    queue = guild_queues.get(guild_id)
 
-    if guild_id not in guild_queues or not guild_queues[guild_id]:
-        # Queue is empty, clear status
-        await bot.change_presence(activity=None)
-        logger.info(f"Queue finished for guild {guild.name}")
-        return
+    while queue:
+        next_item = queue.popleft()
+        url = next_item.url
 
-    # Get next item from queue
-    next_item = guild_queues[guild_id].pop(0)
-    url = next_item["url"]
+        logger.info("Playing next in queue for %s: %s", guild.name, url)
+
+        try:
+            await play_youtube_url(voice_client, url, guild, prefetch=next_item.prefetch)
+            return
+        except Exception as e:
+            logger.error("Error playing next in queue: %s", e)
+
+    # Queue is empty, clear status
+    bot.schedule_presence(None)
+    logger.info("Queue finished for guild %s", guild.name)
 
-    logger.info(f"Playing next in queue for {guild.name}: {url}")
 
+async def retry_youtube_url(
+    voice_client: discord.VoiceClient, url: str, guild: discord.Guild, retry_count: int
+):
+    """Retry a track that ended prematurely, moving on to the queue if it fails to load"""
     try:
-        await play_youtube_url(voice_client, url, guild)
+        await play_youtube_url(voice_client, url, guild, retry_count)
     except Exception as e:
-        logger.error(f"Error playing next in queue: {e}")
-        # Try to play the next one
+        logger.error("Retry failed: %s", e)
         await play_next_in_queue(guild, voice_client)
 
 
 async def play_youtube_url(
-    voice_client: discord.VoiceClient, url: str, guild: discord.Guild, retry_count: int = 0
+    voice_client: discord.VoiceClient,
+    url: str,
+    guild: discord.Guild,
+    retry_count: int = 0,
+    prefetch: asyncio.Task | None = None,
 ):
     """Play a YouTube URL and set up queue handling"""
     guild_id = guild.id
 
+    data = None
+    if prefetch:
+        try:
+            data = await prefetch
+        except Exception as e:
+            logger.warning("Prefetch failed, fetching again: %s", e)
+
     try:
-        player = await YTDLSource.from_url(url, loop=bot.loop, stream=True)
+        if data is None:
+            data = await YTDLSource.extract_info(url, loop=bot.loop, stream=True)
+        player = YTDLSource.from_data(data, stream=True)
     except Exception as e:
-        logger.error(f"Failed to fetch stream info: {e}")
-        # If this fails, move to next song
-        await play_next_in_queue(guild, voice_client)
+        # Callers decide whether to move on to the next song
+        logger.error("Failed to fetch stream info: %s", e)
         raise
 
     # Store current track info for potential retry
@@ -331,7 +489,7 @@ async def play_youtube_url(
 
     def after_playing(error):
         if error:
-            logger.error(f"Player error: {error}")
+            logger.error("Player error: %s", error)
 
         # Check if playback ended prematurely (within 10 seconds suggests a connection error)
         current_time = time.time()
@@ -343,12 +501,13 @@ async def play_youtube_url(
             # If song played for less than 10 seconds and we haven't retried too many times, retry
             if elapsed < 10 and track_info["retry_count"] < 3:
                 logger.warning(
-                    f"Playback ended prematurely after {elapsed:.1f}s. "
-                    f"Retrying (attempt {track_info['retry_count'] + 1}/3)..."
+                    "Playback ended prematurely after %.1fs. Retrying (attempt %d/3)...",
+                    elapsed,
+                    track_info["retry_count"] + 1,
                 )
                 next_retry = track_info["retry_count"] + 1
                 asyncio.run_coroutine_threadsafe(
-                    play_youtube_url(voice_client, track_info["url"], guild, next_retry),
+                    retry_youtube_url(voice_client, track_info["url"], guild, next_retry),
                     bot.loop,
                 )
                 return
@@ -357,20 +516,16 @@ async def play_youtube_url(
         asyncio.run_coroutine_threadsafe(play_next_in_queue(guild, voice_client), bot.loop)
 
     voice_client.play(player, after=after_playing)
+    schedule_prefetch(guild_id)
 
-    await bot.change_presence(
-        activity=discord.Activity(type=discord.ActivityType.listening, name=player.title)
-    )
+    bot.schedule_presence(discord.Activity(type=discord.ActivityType.listening, name=player.title))
 
     return player  # Return so we can get the title
 
 
 def is_url(text: str) -> bool:
     """Check if the provided text is a URL"""
-    url_pattern = re.compile(
-        r"^(https?://)?(www\.)?(youtube\.com|youtu\.be|m\.youtube\.com)/.+$", re.IGNORECASE
-    )
-    return bool(url_pattern.match(text))
+    return bool(URL_PATTERN.match(text))
 
 
 @bot.hybrid_command(name="queue", description="Show the current queue")
@@ -391,15 +546,9 @@ async def show_queue(ctx):
             return await ctx.send(f"{current_song}\n\nQueue is empty!")
         return await ctx.send("Queue is empty and nothing is playing!")
 
-    queue_items = []
-    for i, item in enumerate(guild_queues[guild_id]):
-        if is_url(item["url"]):
-            url_display = item["url"]
-        else:
-            url_display = item["url"].replace("ytsearch:", "Search: ")
-        queue_items.append(f"{i + 1}. {url_display} (requested by {item['requester'].name})")
-
-    queue_list = "\n".join(queue_items)
+    queue_list = "\n".join(
+        f"{i + 1}. {item.display}" for i, item in enumerate(guild_queues[guild_id])
+    )
 
     message = ""
     if current_song:
@@ -420,12 +569,13 @@ async def play_yt(ctx, *, query: str):
 
     # Initialize queue for this guild if it doesn't exist
     if guild_id not in guild_queues:
-        guild_queues[guild_id] = []
+        guild_queues[guild_id] = deque()
 
     try:
         voice_client = await get_voice_client(ctx.author, ctx.guild)
 
-        if not is_url(query):
+        query_is_url = is_url(query)
+        if not query_is_url:
             # Search YouTube for the query and get the first result URL
             search_query = f"ytsearch:{query}"
             await ctx.send(f"Searching for: **{query}**...")
@@ -434,10 +584,20 @@ async def play_yt(ctx, *, query: str):
 
         # If something is already playing, add to queue
         if voice_client.is_playing():
-            guild_queues[guild_id].append({"url": search_query, "requester": ctx.author})
+            # Format the queue line once here rather than on every /queue
+            url_display = query if query_is_url else f"Search: {query}"
+            guild_queues[guild_id].append(
+                QueueItem(
+                    url=search_query,
+                    requester=ctx.author,
+                    display=f"{url_display} (requested by {ctx.author.name})",
+                )
+            )
+
+            schedule_prefetch(guild_id)
 
             position_msg = f"Added to queue at position {len(guild_queues[guild_id])}"
-            if not is_url(query):
+            if not query_is_url:
                 position_msg += f"\nSearch: **{query}**"
 
             await ctx.send(position_msg)
@@ -447,7 +607,7 @@ async def play_yt(ctx, *, query: str):
         await ctx.send(f"Now playing: **{player.title}**")
 
     except Exception as e:
-        logger.error(f"Error playing YouTube URL: {e}", exc_info=True)
+        logger.error("Error playing YouTube URL: %s", e, exc_info=True)
         await ctx.send(f"An error occurred: {e}")
 
 
@@ -463,15 +623,14 @@ async def on_voice_state_update(member, before, after):
         members = [m for m in before.channel.members if not m.bot]
 
         if not members:
-            logger.info(f"No users left in {before.channel.name}, disconnecting...")
+            logger.info("No users left in %s, disconnecting...", before.channel.name)
             # Clear queue and current track info
             guild_id = member.guild.id
-            if guild_id in guild_queues:
-                guild_queues[guild_id].clear()
+            clear_guild_queue(guild_id)
             if guild_id in guild_current_track:
                 del guild_current_track[guild_id]
 
-            await bot.change_presence(activity=None)
+            bot.schedule_presence(None)
             await member.guild.voice_client.disconnect()
 
 
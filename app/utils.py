@@ -1,36 +1,124 @@
+import atexit
 import logging
 import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
-from config import RadioConfig
+import httpx
+from config import RadioConfig, radio_by_name, station_names_by_tag
 from pyradios import RadioBrowser
 
 logger = logging.getLogger(__name__)
 
+# Kept separate from the yt-dlp pool so RadioBrowser lookups never queue behind YouTube fetches
+RADIO_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="radio-search")
+atexit.register(RADIO_SEARCH_EXECUTOR.shutdown, wait=False, cancel_futures=True)
 
-def search_radio_station_by_tags(tags: str | list[str]) -> RadioConfig | None:
-    logger.info(f"Searching for radio stations with tags: {tags}")
-    rb = RadioBrowser()
+SEARCH_CACHE_MAXSIZE = 256
+SEARCH_CACHE_TTL = 600  # seconds
 
-    # Convert list to comma-separated string if needed
-    tag_string = ",".join(tags) if isinstance(tags, list) else tags
-    results = rb.search(tag_list=tag_string)
+# Normalized tag tuple -> (expiry timestamp, matching stations), oldest entries first
+_search_cache: OrderedDict[tuple[str, ...], tuple[float, list[dict]]] = OrderedDict()
+_search_cache_lock = threading.Lock()
 
-    if results and isinstance(results, list) and len(results) > 0:
-        # Filter out stations with empty URLs
-        valid_results = [r for r in results if r.get("url_resolved")]
 
-        if not valid_results:
-            logger.warning(f"No stations with valid URLs found for tags: {tags}")
+_radio_browser: RadioBrowser | None = None
+_radio_browser_lock = threading.Lock()
+
+
+def get_radio_browser() -> RadioBrowser:
+    """Return a shared RadioBrowser client; its constructor performs server discovery."""
+    global _radio_browser
+    # Searches run on several executor threads; only one may build the client
+    with _radio_browser_lock:
+        if _radio_browser is None:
+            # Own the client so it gets explicit pool limits (only two search workers use it)
+            # and is closed at exit; httpx's default 5s timeout is kept
+            session = httpx.Client(
+                limits=httpx.Limits(max_connections=20, max_keepalive_connections=10)
+            )
+            atexit.register(session.close)
+            _radio_browser = RadioBrowser(session=session)
+        return _radio_browser
+
+
+def normalize_tags(tags: str | list[str]) -> tuple[str, ...]:
+    """Normalize tags into a sorted, lowercased tuple usable as a cache key."""
+    tag_list = tags.split(",") if isinstance(tags, str) else tags
+    return tuple(sorted({t.strip().lower() for t in tag_list if t.strip()}))
+
+
+def search_known_station_by_tags(tags: str | list[str]) -> RadioConfig | None:
+    """Pick a random configured station carrying all of the given tags, if any."""
+    key = normalize_tags(tags)
+    if not key:
+        return None
+
+    tag_sets = [station_names_by_tag.get(tag, set()) for tag in key]
+    names = set.intersection(*tag_sets)
+    if not names:
+        return None
+
+    name = random.choice(sorted(names))
+    logger.info("Selected configured station %s for tags: %s", name, tags)
+    return radio_by_name[name]
+
+
+def _get_cached_stations(key: tuple[str, ...]) -> list[dict] | None:
+    with _search_cache_lock:
+        entry = _search_cache.get(key)
+        if entry is None:
+            return None
+        expires_at, stations = entry
+        if expires_at < time.monotonic():
+            del _search_cache[key]
             return None
+        _search_cache.move_to_end(key)
+        return stations
+
+
+def _set_cached_stations(key: tuple[str, ...], stations: list[dict]) -> None:
+    with _search_cache_lock:
+        _search_cache[key] = (time.monotonic() + SEARCH_CACHE_TTL, stations)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_MAXSIZE:
+            _search_cache.popitem(last=False)
+
+
+def fetch_stations_by_tags(key: tuple[str, ...]) -> list[dict]:
+    """Return RadioBrowser results with a stream URL for the normalized tags, using the cache."""
+    stations = _get_cached_stations(key)
+    if stations is not None:
+        logger.info("Using cached radio station results for tags: %s", key)
+        return stations
+
+    results = get_radio_browser().search(tag_list=",".join(key))
+
+    stations = []
+    if results and isinstance(results, list):
+        # Filter out stations with empty URLs
+        stations = [r for r in results if r.get("url_resolved")]
+
+    _set_cached_stations(key, stations)
+    return stations
+
+
+def search_radio_station_by_tags(tags: str | list[str]) -> RadioConfig | None:
+    logger.info("Searching for radio stations with tags: %s", tags)
+
+    stations = fetch_stations_by_tags(normalize_tags(tags))
 
-        logger.info(f"Found {len(valid_results)} valid stations, selecting random one")
-        result = random.choice(valid_results)
-        logger.info(f"Selected station: {result['name']} - {result['url_resolved']}")
+    if not stations:
+        logger.warning("No stations with valid URLs found for tags: %s", tags)
+        return None
 
-        return RadioConfig(
-            name=result["name"],
-            stream_url=result["url_resolved"],
-        )
+    logger.info("Found %s valid stations, selecting random one", len(stations))
+    result = random.choice(stations)
+    logger.info("Selected station: %s - %s", result["name"], result["url_resolved"])
 
-    logger.warning(f"No stations found for tags: {tags}")
-    return None
+    return RadioConfig(
+        name=result["name"],
+        stream_url=result["url_resolved"],
+    )